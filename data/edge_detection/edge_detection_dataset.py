@@ -59,11 +59,11 @@ class EdgeDetectionDataset(torch.utils.data.Dataset):
     
     def base_input_transform(self, x):
         x = torch.from_numpy(x)
-        x = x.float() / 255
+        x = x.to(torch.float32, copy=True).div_(255) # Always a fresh copy, so scaling in place never touches the source array
         x = x.permute(2, 0, 1)
         return x
     
     def base_target_transform(self, x):
         x = torch.from_numpy(x)
-        x = x.float() / 255
+        x = x.to(torch.float32, copy=True).div_(255)
         return x
@@ -7,6 +7,12 @@ import torch.nn as nn
 
 WEIGHTS_EXTENSION = ".pth"
 
+# Passed to TorchInductor as per compilation options by _Network.compile_forward (global config is untouched)
+INDUCTOR_CONFIGS = {
+    "conv_1x1_as_mm": True,
+    "max_autotune": True,
+}
+
 class _Network(nn.Module, ABC):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -20,6 +26,12 @@ class _Network(nn.Module, ABC):
 
         strict = not (unexpected_ok or missing_ok)
         loaded_state_dict = torch.load(load_path, map_location=torch.device(map_location))
+
+        # Rename keys saved by older module layouts (e.g. nn.MultiheadAttention) before comparing against our own
+        for name, module in self.named_modules():
+            if hasattr(module, "_remap_legacy_keys"):
+                module._remap_legacy_keys(loaded_state_dict, f"{name}." if name else "")
+
         if not strict:
             model_state_dict = self.state_dict()
 
@@ -45,6 +57,16 @@ class _Network(nn.Module, ABC):
 
         self.load_state_dict(loaded_state_dict, strict=strict)
 
+    def compile_forward(self, cudagraphs: bool=True, fullgraph: bool=True, dynamic: bool=False, **kwargs):
+        """
+        Replace this instance's forward with a TorchInductor compiled one and return self
+        INDUCTOR_CONFIGS are passed as options of this compilation only, cudagraphs=True adds CUDA graphs like mode="reduce-overhead"
+        NOTE : Compile after any deepcopy of the network (e.g. EMA), the copy would still call the original forward
+        """
+        options = {**INDUCTOR_CONFIGS, "triton.cudagraphs": cudagraphs}
+        self.forward = torch.compile(self.forward, fullgraph=fullgraph, dynamic=dynamic, options=options, **kwargs)
+        return self
+
     def save(self, save_path: str):
         """
         All saves should be under the same path folder, under different tag folders, with the same filename
@@ -4,6 +4,7 @@ from .embeddings import TimestepEmbedder, LabelEmbedder, Modulator
 from .initialize import initialize_weights, initalize_diffusion
 from .conditioned_sequential import ConditionedSequential
 from .lambda_module import LambdaModule
+from .attention import SelfAttention, CrossAttention
 from .geodesic_loss import SpecialEuclideanGeodesicLoss, SpecialOrthogonalLoss, PointCloudMSELoss
 
 from .normal.convolution_triplet import ConvolutionTriplet
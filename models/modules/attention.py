@@ -0,0 +1,73 @@
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from torch import Tensor
+
+def _split_heads(x: Tensor, num_heads: int) -> Tensor:
+    # [N, L, C] -> [N, heads, L, C/heads]
+    *N, L, C = x.shape
+    return x.view(*N, L, num_heads, C // num_heads).transpose(-3, -2)
+
+def _merge_heads(x: Tensor) -> Tensor:
+    # [N, heads, L, D] -> [N, L, heads*D]
+    *N, heads, L, D = x.shape
+    return x.transpose(-3, -2).reshape(*N, L, heads * D)
+
+class _MultiheadAttention(nn.Module):
+    """
+    Shared parameters of the attention modules, laid out like nn.MultiheadAttention:
+    a packed 3C x C Q, K, V projection (so initialize_weights gives it the same xavier bound) and an output projection
+    """
+    def __init__(self, embed_dim: int, num_heads: int, dropout: float = 0.0) -> None:
+        super().__init__()
+
+        assert embed_dim % num_heads == 0, f"{embed_dim} is not divisible by {num_heads} heads"
+
+        self.embed_dim = embed_dim
+        self.num_heads = num_heads
+        self.dropout = dropout
+
+        self.in_proj = nn.Linear(embed_dim, 3 * embed_dim) # Packed Q, K, V
+        self.out_proj = nn.Linear(embed_dim, embed_dim)
+
+    def _attend(self, q: Tensor, k: Tensor, v: Tensor):
+        q, k, v = [_split_heads(t, self.num_heads) for t in (q, k, v)]
+        x = F.scaled_dot_product_attention(q, k, v, dropout_p=self.dropout if self.training else 0.0)
+        return self.out_proj(_merge_heads(x))
+
+    @staticmethod
+    def _remap_legacy_keys(state_dict, prefix):
+        # nn.MultiheadAttention stores the packed projection as raw parameters
+        for name in ("weight", "bias"):
+            legacy_key = f"{prefix}in_proj_{name}"
+            if legacy_key in state_dict:
+                state_dict[f"{prefix}in_proj.{name}"] = state_dict.pop(legacy_key)
+
+    def _load_from_state_dict(self, state_dict, prefix, *args, **kwargs):
+        self._remap_legacy_keys(state_dict, prefix)
+        super()._load_from_state_dict(state_dict, prefix, *args, **kwargs)
+
+class SelfAttention(_MultiheadAttention):
+    """
+    Multi-Head Self Attention computed with F.scaled_dot_product_attention so the fused
+    (Flash / Memory Efficient) kernels can be dispatched instead of materializing the attention matrix.
+    Checkpoints saved with nn.MultiheadAttention still load.
+    """
+    def forward(self, x: Tensor):
+        q, k, v = self.in_proj(x).chunk(3, dim=-1)
+        return self._attend(q, k, v)
+
+class CrossAttention(_MultiheadAttention):
+    """
+    Multi-Head Cross Attention computed with F.scaled_dot_product_attention.
+    Queries come from x while keys and values both come from the context.
+    Checkpoints saved with nn.MultiheadAttention still load.
+    """
+    def forward(self, x: Tensor, context: Tensor):
+        C = self.embed_dim
+        weight, bias = self.in_proj.weight, self.in_proj.bias
+        q = F.linear(x, weight[:C], bias[:C])
+        k, v = F.linear(context, weight[C:], bias[C:]).chunk(2, dim=-1) # K, V from one GEMM on the context
+        return self._attend(q, k, v)
@@ -3,7 +3,6 @@ from functools import partial
 
 import torch
 import torch.nn as nn
-import torch.nn.functional as F
 
 from ...modules import Modulator
 
@@ -16,6 +15,7 @@ class PatchExpandingV2_Modulated(nn.Module):
 
     def __init__(self, dim: int, mod_dims: int, norm_layer: Callable[..., nn.Module] = nn.LayerNorm):
         super().__init__()
+        assert dim % 2 == 0, f"Expansion to 2*dim must split evenly into 4 sub-patches, got dim={dim}"
         self.dim = dim # C
         self.mod = Modulator(mod_dims, dim, n_unsqueeze=2)
         self.expansion = nn.Linear(dim, 2 * dim, bias=False) # Linear expansion first to share more information
@@ -58,29 +58,15 @@ class PatchExpandingV2_Modulated(nn.Module):
 
         return x
 
-def _pad_expansion(x: torch.Tensor, distributed: bool = False) -> torch.Tensor:
-    *B, H, W, C = x.shape
-    pad_c = (4 - C % 4) % 4  # Number of channels to add
-
-    # No padding needed
-    if pad_c == 0:
-        return x 
-    
-    if not distributed:
-        x = F.pad(x, (0, pad_c), "constant", 0)  # Pad with zeros to the end of channels
-        return x
-    else:
-        raise NotImplementedError()
-
 def _patch_expanding_pad(x: torch.Tensor) -> torch.Tensor:
     *B, H_HALF, W_HALF, C_QUAD = x.shape
 
     C = C_QUAD // 4
 
-    x = _pad_expansion(x)
-
     x = x.view(*B, H_HALF, W_HALF, 2, 2, C)
 
+    # NOTE : Channels split as (2, 2, C) with C fastest, the reverse of F.pixel_shuffle's (C, 2, 2) order,
+    # so this cannot become a pixel shuffle without reordering the trained expansion and norm weights
     x = x.permute(0, 1, 3, 2, 4, 5).contiguous()
 
     x = x.view(*B, H_HALF * 2, W_HALF * 2, C)
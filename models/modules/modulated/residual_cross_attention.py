@@ -1,14 +1,13 @@
 from typing import *
 from functools import partial
 
-import numpy as np
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 
 from torch import Tensor
 
-from ...modules import Modulator
+from ...modules import Modulator, CrossAttention
 
 def _unfold_padding_prep(x: Tensor, window_height: int, window_width: int):
 
@@ -23,9 +22,8 @@ def _unfold_padding_prep(x: Tensor, window_height: int, window_width: int):
     pad_w2 = mod_width - pad_w1
 
     if mod_height > 0 or mod_width > 0:
-        x = x.permute(0, -1, -3, -2)
-        x = F.pad(x, (pad_w1, pad_w2, pad_h1, pad_h2), 'constant', 0)
-        x = x.permute(0, -2, -1, -3)
+        # Pad H and W in place of the channel-last layout so the windows are gathered from contiguous C rows
+        x = F.pad(x, (0, 0, pad_w1, pad_w2, pad_h1, pad_h2), 'constant', 0)
 
     padding_info = (pad_h1, pad_h2, pad_w1, pad_w2)
     return x, padding_info
@@ -34,7 +32,7 @@ def _fold_unpadding_prep(x: Tensor, padding_info):
 
     pad_h1, pad_h2, pad_w1, pad_w2 = padding_info
 
-    if np.sum(padding_info) == 0:
+    if sum(padding_info) == 0:
         return x
 
     # Set 0 dimensional pads to None so they can be ignored with slicing
@@ -61,17 +59,16 @@ def _extract_windows(feature_map: Tensor, window_height, window_width):
 
     feature_map, padding_info = _unfold_padding_prep(feature_map, window_height, window_width)
 
-    # Unfold the feature map into windows for both dimensions
-    unfolded_height = feature_map.unfold(-3, window_height, window_height) # New dim (from H) created at the end
-
-    unfolded_both = unfolded_height.unfold(-3, window_width, window_width) # So we do -3 again for W
-    # Send C to the back
-    windows = unfolded_both.permute(0, -5, -4, -2, -1, -3)
+    *B, H, W, C = feature_map.shape
+    H_unfolded = H // window_height
+    W_unfolded = W // window_width
 
-    # The shape after unfold will be [B*, H_unfolded, W_unfolded, window_height, window_width, C]
-    *B, H_unfolded, W_unfolded, H_window, W_window, C = windows.shape
+    # Windows never overlap (stride == window), so splitting H and W is a pure view
+    windows = feature_map.view(*B, H_unfolded, window_height, W_unfolded, window_width, C)
+    # [B*, H_unfolded, W_unfolded, window_height, window_width, C], materialized in a single copy
+    windows = windows.permute(0, 1, 3, 2, 4, 5).contiguous()
     # We need [*B, H_unfolded, W_unfolded, <WindowContext>, C]
-    windows = windows.reshape(*B, H_unfolded, W_unfolded, window_height * window_width, C)
+    windows = windows.view(*B, H_unfolded, W_unfolded, window_height * window_width, C)
 
     return windows, padding_info
 
@@ -92,7 +89,7 @@ class SwinResidualCrossAttention_Modulated(nn.Module):
 
         self.mod_x = Modulator(mod_dims, embed_dim, n_unsqueeze=2)
         self.mod_r = Modulator(mod_dims, embed_dim, n_unsqueeze=2)
-        self.cross_attention = nn.MultiheadAttention(embed_dim, num_heads, dropout=attention_dropout, batch_first=True)
+        self.cross_attention = CrossAttention(embed_dim, num_heads, dropout=attention_dropout)
         self.norm = norm_layer(embed_dim)
 
     def forward(self, x: Tensor, r: Tensor, c: Tensor):
@@ -109,15 +106,15 @@ class SwinResidualCrossAttention_Modulated(nn.Module):
         *B, H, W, WINDOW, C = r.shape
 
         Q = x.reshape(-1, WINDOW, C)
-        K = V = r.reshape(-1, WINDOW, C)
+        KV = r.reshape(-1, WINDOW, C)
 
         # output = attended residuals
-        output, attention_weights = self.cross_attention(Q, K, V)
+        output = self.cross_attention(Q, KV)
 
         # Folding
-        output = output.reshape(*B, H, W, self.window_height, self.window_width, C)
-        output = output.permute(0, -5, -3, -4, -2, -1)
-        output = output.reshape(*B, H * self.window_height, W * self.window_width, C)
+        output = output.view(*B, H, W, self.window_height, self.window_width, C)
+        output = output.permute(0, 1, 3, 2, 4, 5).contiguous()
+        output = output.view(*B, H * self.window_height, W * self.window_width, C)
 
         # Unpadding
         output = _fold_unpadding_prep(output, padding_info)
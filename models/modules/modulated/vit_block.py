@@ -7,7 +7,7 @@ import torch
 import torch.nn as nn
 from torchvision.models.vision_transformer import MLPBlock
 
-from ...modules import Modulator
+from ...modules import Modulator, SelfAttention
 
 class ViTEncoderBlock_Modulated(nn.Module):
     """Transformer encoder block."""
@@ -30,7 +30,7 @@ class ViTEncoderBlock_Modulated(nn.Module):
 
         # Attention block
         self.ln_1 = norm_layer(hidden_dim)
-        self.self_attention = nn.MultiheadAttention(hidden_dim, num_heads, dropout=attention_dropout, batch_first=True)
+        self.self_attention = SelfAttention(hidden_dim, num_heads, dropout=attention_dropout)
         self.dropout = nn.Dropout(dropout)
 
         # MLP block
@@ -39,9 +39,10 @@ class ViTEncoderBlock_Modulated(nn.Module):
 
     def forward(self, input: torch.Tensor, c: torch.Tensor):
         torch._assert(input.dim() == 3, f"Expected (batch_size, seq_length, hidden_dim) got {input.shape}")
+        # NOTE : Modulation comes BEFORE the LayerNorm, so it cannot be folded into the norm's affine
         x = self.mod1(input, c)
         x = self.ln_1(x)
-        x, _ = self.self_attention(x, x, x, need_weights=False)
+        x = self.self_attention(x)
         x = self.dropout(x)
         x = x + input
 
@@ -7,6 +7,8 @@ import torch
 import torch.nn as nn
 from torchvision.models.vision_transformer import MLPBlock
 
+from ..attention import SelfAttention
+
 class ViTEncoderBlock(nn.Module):
     """Transformer encoder block."""
 
@@ -24,7 +26,7 @@ class ViTEncoderBlock(nn.Module):
 
         # Attention block
         self.ln_1 = norm_layer(hidden_dim)
-        self.self_attention = nn.MultiheadAttention(hidden_dim, num_heads, dropout=attention_dropout, batch_first=True)
+        self.self_attention = SelfAttention(hidden_dim, num_heads, dropout=attention_dropout)
         self.dropout = nn.Dropout(dropout)
 
         # MLP block
@@ -40,7 +42,7 @@ class ViTEncoderBlock(nn.Module):
         # Just check for it with hooks or iterations after backwards() and change the grad to None when needed
         # print("Out", torch.max(torch.abs(x)), torch.min(torch.abs(x)))
         
-        x, _ = self.self_attention(x, x, x, need_weights=False)
+        x = self.self_attention(x)
         x = self.dropout(x)
         x = x + input
 
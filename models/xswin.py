@@ -1,6 +1,7 @@
 
 from typing import *
 from functools import partial
+from contextlib import nullcontext
 
 import torch
 import torch.nn as nn
@@ -32,6 +33,7 @@ class XNetSwinTransformer(_Network):
         input_size (List[int]): Gives input size of the data. If not provided, Global ViT Layers will NOT have positional embeddings
         final_downsample (bool): Do a final downsampling for the encoder towards the mid-network. If there are no Global ViT Layers, this is ignored.
         cross_attention_residual (bool): Use cross attention for Swin residual connections
+        middle_autocast_dtype (torch.dtype, optional): Run the Global ViT Layers under autocast with this dtype (e.g. torch.bfloat16) so attention can use the Flash kernels. Default: None.
         weights (str): Path to load weights
     """
 
@@ -53,6 +55,7 @@ class XNetSwinTransformer(_Network):
         final_downsample: bool = True,
         residual_cross_attention: bool = True,
         smooth_conv=True,
+        middle_autocast_dtype: Optional[torch.dtype] = None,
         weights=None,
     ):
         super().__init__()
@@ -66,6 +69,7 @@ class XNetSwinTransformer(_Network):
         self.depths = depths
         self.window_size = window_size
         self.residual_cross_attention = residual_cross_attention
+        self.middle_autocast_dtype = middle_autocast_dtype
 
         self.smooth_conv = smooth_conv
         self.has_global_stages = global_stages > 0
@@ -84,6 +88,7 @@ class XNetSwinTransformer(_Network):
         ################################################
         
         self.encoder : List[nn.Module] = []
+        self._encoder_plan : List[Tuple[int, Optional[int]]] = [] # (stage, downsample) indices into self.encoder
         stage_block_id = 0
         # Encoder Swin Blocks
         for i_stage in range(len(depths)):
@@ -108,10 +113,13 @@ class XNetSwinTransformer(_Network):
                     )
                 )
                 stage_block_id += 1
+            i_encoder_stage, i_downsample = len(self.encoder), None
             self.encoder.append(nn.Sequential(*stage))
             # Patch Merging Layer
             if i_stage < (len(depths) - 1) or self.final_downsample:
+                i_downsample = len(self.encoder)
                 self.encoder.append(PatchMergingV2(dim, norm_layer))
+            self._encoder_plan.append((i_encoder_stage, i_downsample))
 
         self.encoder = nn.ModuleList(self.encoder)
 
@@ -121,7 +129,7 @@ class XNetSwinTransformer(_Network):
         # MIDDLE
         ################################################
 
-        self.set_positional_embedding(input_size)
+        self.set_input_size(input_size)
 
         self.middle : List[nn.Module] = []
         for _ in range((global_stages)):
@@ -142,6 +150,7 @@ class XNetSwinTransformer(_Network):
         ################################################
 
         self.decoder : List[nn.Module] = []
+        self._decoder_plan : List[Tuple[Optional[int], Optional[int], int, int]] = [] # (upsample, cross attention, stage) indices into self.decoder, residual index
 
         # stage_block_id = 0 # NOTE : Not reseting dropout scheduler
         # Decoder Swin Blocks
@@ -149,11 +158,15 @@ class XNetSwinTransformer(_Network):
             stage: List[nn.Module] = []
             dim = embed_dim * 2**i_stage
 
+            i_upsample, i_cross_attention = None, None
+
             # add patch merging layer
             if i_stage < (len(depths) - 1) or self.final_downsample:
+                i_upsample = len(self.decoder)
                 self.decoder.append(PatchExpandingV2(2*dim, norm_layer)) # NOTE : Double input dim
 
             if self.residual_cross_attention:
+              i_cross_attention = len(self.decoder)
               self.decoder.append(
                 SwinResidualCrossAttention(window_size=window_size, embed_dim=dim, 
                                            num_heads=num_heads[i_stage], attention_dropout=attention_dropout,
@@ -177,10 +190,13 @@ class XNetSwinTransformer(_Network):
                     )
                 )
                 if i_layer == 0:
+                    # NOTE : The next Swin block adds this projection back through its residual (x + norm1(attn(x))),
+                    # so it cannot be folded into that block's attention weights
                     stage.append(
                         PointwiseConvolution(2*dim, dim) # Reduce the dimensionality after first Swin in Stage
                     )
                 stage_block_id += 1
+            self._decoder_plan.append((i_upsample, i_cross_attention, len(self.decoder), i_stage)) # Encoder stage i_stage holds the residual
             self.decoder.append(nn.Sequential(*stage))
 
         self.decoder = nn.ModuleList(self.decoder)
@@ -195,11 +211,18 @@ class XNetSwinTransformer(_Network):
 
         initialize_weights(self)
 
+        # Convolutions run in NHWC, so the B C H W <-> B H W C permutes around them are views rather than copies
+        self.to(memory_format=torch.channels_last)
+
         self.load(weights)
 
     def forward(self, x):
 
+        x = x.contiguous(memory_format=torch.channels_last)
+
         original_spatial_shape = (x.size(-2), x.size(-1))
+        # Precomputed stage shapes only hold for the declared input size
+        stage_shapes = self.stage_shapes if original_spatial_shape == self.input_size else None
 
         if self.smooth_conv:
             conv_residual = self.smooth_conv_in(x)
@@ -208,41 +231,46 @@ class XNetSwinTransformer(_Network):
             x = self.patching(x)
         
         residuals = []
-        for i in range(0, len(self.encoder), 2):
+        for i_stage, i_downsample in self._encoder_plan:
 
-            x = self.encoder[i](x) # Encoder Stage
+            x = self.encoder[i_stage](x) # Encoder Stage
 
             residuals.append(x)
-            if i+1 < (len(self.encoder) - 1) or self.final_downsample:
-                x = self.encoder[i+1](x) # Downsample (PatchMerge)
+            if i_downsample is not None:
+                x = self.encoder[i_downsample](x) # Downsample (PatchMerge)
 
         if self.has_global_stages and not isinstance(self.middle, nn.Identity):
-            *B, H, W, C = x.shape
-            x = x.contiguous().view(*B, H*W, C)
+            H, W = x.shape[-3:-1]
+            x = x.flatten(-3, -2) # B H W C -> B L C
 
             if self.pos_embed is not None:
                 x = x + self.pos_embed
-            x = self.middle(x) # ViT Encoder
+            dtype = x.dtype
+            with self._middle_autocast(x.device):
+                x = self.middle(x) # ViT Encoder
+            x = x.to(dtype) # Back to the decoder's precision
 
-            x = x.contiguous().view(*B, H, W, C)
+            x = x.unflatten(-2, (H, W)) # B L C -> B H W C
 
-        for i_residual, i in zip(
-            range(len(residuals)-1, -1, -1), # Count backwards for residual indices 
-            range(0 - int(not self.final_downsample), len(self.decoder), 2 + int(self.residual_cross_attention))
-        ):
-            
-            if i > 0 or self.final_downsample:
-                residual_spatial_shape = residuals[i_residual].shape[-3:-1] # B H W C
-                x = self.decoder[i](x, target_shape=residual_spatial_shape) # Upsample (PatchExpand)
+        for i_upsample, i_cross_attention, i_stage, i_residual in self._decoder_plan:
 
-            if self.residual_cross_attention:
-                residual = self.decoder[i+1](x, residuals[i_residual]) # Cross Attention Skip Connection
+            if i_upsample is not None:
+                if stage_shapes is not None:
+                    residual_spatial_shape = stage_shapes[i_residual]
+                else:
+                    residual_spatial_shape = residuals[i_residual].shape[-3:-1] # B H W C
+                x = self.decoder[i_upsample](x, target_shape=residual_spatial_shape) # Upsample (PatchExpand)
+
+            if i_cross_attention is not None:
+                residual = self.decoder[i_cross_attention](x, residuals[i_residual]) # Cross Attention Skip Connection
             else:
                 residual = residuals[i_residual]
 
+            # NOTE : The first decoder Swin block adds this back through its own residual path,
+            # so the concatenation must be materialized and cannot be split across the next projection
             x = torch.cat((x, residual), dim=-1) # Dumb Skip Connection
 
-            x = self.decoder[i+(1 + int(self.residual_cross_attention))](x)  # Decoder Stage
+            x = self.decoder[i_stage](x)  # Decoder Stage
 
         # Does equally spaced padding to recover the original shape to concat with
         x = self.unpatching(x, target_shape=original_spatial_shape) # B H W C -> B C H W
@@ -256,8 +284,27 @@ class XNetSwinTransformer(_Network):
         if self.num_classes == 1:
             x = x.squeeze(1)
 
-        return x
+        return x.contiguous() # Hand back a standard contiguous layout (the convolutions ran in channels_last)
     
+    def set_input_size(self, input_size):
+        """
+        Record the input size and precompute the latent (H, W) of every encoder stage,
+        so the decoder's upsampling targets are constants rather than read from tensor shapes
+        """
+        self.input_size = None if input_size is None else tuple(input_size)
+        self.stage_shapes = None
+
+        if self.input_size is not None:
+            latent_H = self.input_size[0] // self.patch_size[0]
+            latent_W = self.input_size[1] // self.patch_size[1]
+            self.stage_shapes = []
+            for i in range(len(self.depths)):
+                self.stage_shapes.append((latent_H, latent_W))
+                latent_H = (latent_H // 2) + (latent_H % 2) # Dims are padded up
+                latent_W = (latent_W // 2) + (latent_W % 2) # Dims are padded up
+
+        return self.set_positional_embedding(input_size)
+
     def set_positional_embedding(self, input_size):
 
         if input_size is None or not self.has_global_stages:
@@ -277,3 +324,8 @@ class XNetSwinTransformer(_Network):
         self.pos_embed = create_positional_embedding(middle_stage_features, latent_H, latent_W, device)
 
         return self.pos_embed
+
+    def _middle_autocast(self, device):
+        if self.middle_autocast_dtype is None:
+            return nullcontext()
+        return torch.autocast(device_type=device.type, dtype=self.middle_autocast_dtype)
@@ -178,6 +178,8 @@ def main(args):
     ema = deepcopy(model).to(device)
     requires_grad(ema, False)
     model = model.to(device)
+    if args.compile:
+        model.compile_forward()
     diffusion = create_diffusion(timestep_respacing="")
     vae = AutoencoderKL.from_pretrained(f"stabilityai/sd-vae-ft-{args.vae}").to(device)
     logger.info(f"Parameters: {sum(p.numel() for p in model.parameters()):,}")
@@ -283,5 +285,6 @@ if __name__ == "__main__":
     parser.add_argument("--log-every", type=int, default=100)
     parser.add_argument("--ckpt-every", type=int, default=10000)
     parser.add_argument("--experiment-dir", type=str, help="Path to the experiment directory to resume training")
+    parser.add_argument("--compile", action="store_true", help="Compile the model forward with torch.compile")
     args = parser.parse_args()
     main(args)